@@ -62,6 +62,13 @@ The script provides several flags to customize its behavior:
   Example:
   $ pack --output-tokens-size-only
 
+- `--exact-tokens`:
+  By default the total token count reported at the end (and used for the
+  large-output warning) is estimated from the output length. This flag counts
+  the tokens exactly with `tiktoken` instead, which is slower on large outputs.
+  Example:
+  $ pack --exact-tokens | pbcopy
+
 Output Behavior:
 - If the output is a terminal (TTY), the script will write to a file named
   `output.txt` in the current directory.
@@ -70,16 +77,22 @@ Output Behavior:
 """
 
 import argparse
+import functools
 import sys
 import subprocess
 import os
 import logging
+import operator
 from pathlib import Path
 import concurrent.futures
+import errno
 import fnmatch
+import itertools
 import re
 import shlex
-from typing import TextIO
+import stat
+import threading
+from typing import Any, Callable, Iterable, Iterator, TextIO
 
 try:
     import tiktoken
@@ -92,14 +105,51 @@ except ImportError:
 
 # --- Configuration ---
 DEFAULT_OUTPUT_FILENAME = "output.txt"
-MAX_WORKERS = os.cpu_count() or 4  # Use CPU count or default to 4 workers
-READ_CHUNK_SIZE = 1024 * 1024  # Read in 1MB chunks for binary check
+CPU_COUNT = os.cpu_count() or 4  # Use CPU count or default to 4
+# File reads are IO-bound and mostly wait on the disk, so use more threads
+# than cores to keep more reads in flight. This matches the default of
+# concurrent.futures.ThreadPoolExecutor.
+MAX_WORKERS = min(32, CPU_COUNT + 4)
+# Leading bytes read when checking a file for binary content. 64KB catches
+# binaries that start with a text header while staying a single read.
+READ_CHUNK_SIZE = 64 * 1024
 DEFAULT_max_file_size_bytes = 5 * 1024 * 1024  # Default 5 MB
+TOKENIZE_BATCH_SIZE = 256  # Files written and tokenized per batch
+TOKENIZE_BATCH_CHARS = 4 * 1024 * 1024  # Content characters per batch
+READ_BLOCK_BYTES = 16 * 1024 * 1024  # File bytes read ahead per block
+WRITE_BUFFER_CHARS = 1024 * 1024  # Output characters gathered per write()
+PROGRESS_INTERVAL = 1024  # Files written between progress updates
 
 # --- Helper Functions ---
 
-# Define a reasonable chunk size for reading
-READ_CHUNK_SIZE = 1024  # Read 1KB chunk
+
+def batched(iterable: Iterable,
+            n: int,
+            max_size: int = 0,
+            size: Callable[[Any], int] | None = None) -> Iterator[list]:
+    """
+    Yield successive lists of up to n items from iterable.
+    If max_size is set, a list is also closed as soon as the total size of
+    its items, as measured by size, reaches max_size, so that a few large
+    items don't end up together in one list. A single item larger than
+    max_size still gets a list of its own.
+    """
+    if not max_size:
+        iterator = iter(iterable)
+        while batch := list(itertools.islice(iterator, n)):
+            yield batch
+        return
+    batch = []
+    batch_size = 0
+    for item in iterable:
+        batch.append(item)
+        batch_size += size(item)
+        if len(batch) >= n or batch_size >= max_size:
+            yield batch
+            batch = []
+            batch_size = 0
+    if batch:
+        yield batch
 
 
 def parse_size(size_str: str) -> int:
@@ -137,8 +187,9 @@ def parse_size(size_str: str) -> int:
 
 
 # Common non-text file extensions (lowercase)
-# This list is not exhaustive but covers many common binary formats.
-NON_TEXT_EXTENSIONS = [
+# This set is not exhaustive but covers many common binary formats. It is
+# only used for lookups, hence a frozenset.
+NON_TEXT_EXTENSIONS = frozenset({
     # Images
     '.jpg',
     '.jpeg',
@@ -193,6 +244,7 @@ NON_TEXT_EXTENSIONS = [
 
     # Compiled Code / Object Files
     '.o',
+    # Also Wavefront OBJ (can be text, but often large/complex geometry data)
     '.obj',
     '.class',
     '.pyc',
@@ -228,7 +280,6 @@ NON_TEXT_EXTENSIONS = [
 
     # Other common binary/non-text data
     '.bin',
-    '.dat',  # Reiterate .dat as it's common
     '.pickle',
     '.pkl',  # Python serialized objects
     '.joblib',  # Scikit-learn models
@@ -262,25 +313,79 @@ NON_TEXT_EXTENSIONS = [
     '.dxf',  # CAD files (DXF can be text, but often complex)
     '.skp',  # SketchUp files
     '.stl',  # Stereolithography (3D printing)
-    # Wavefront OBJ (can be text, but often large/complex geometry data)
-    '.obj',
     '.fbx',  # Autodesk FBX (3D models)
     '.gltf',
     '.glb',  # GL Transmission Format (glb is binary)
     '.swp',  # Vim swap file (binary)
     '.lock',  # Often empty or contain minimal binary data
-]
+})
+
 
-# Convert to a set for slightly faster lookups, though for this size, a list is fine too.
-NON_TEXT_EXTENSIONS_SET = set(NON_TEXT_EXTENSIONS)
+@functools.lru_cache(maxsize=1)
+def _get_encoding():
+    """Return the cl100k_base encoding, loading it only once per process."""
+    return tiktoken.get_encoding("cl100k_base")
 
 
 def count_tokens(text: str) -> int:
     """Count the number of tokens in a text string."""
     if tiktoken is None:
         return -1  # Return -1 if tiktoken is not installed
-    encoding = tiktoken.get_encoding("cl100k_base")
-    return len(encoding.encode(text))
+    # encode_ordinary treats special-token markers such as <|endoftext|> as
+    # plain text instead of raising, which is what we want for file content.
+    return len(_get_encoding().encode_ordinary(text))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheaply estimate the number of tokens in a text string.
+    Uses the common ~4 characters per token rule of thumb, which is close
+    enough for source code to decide whether an output is too large.
+    """
+    return len(text) // 4
+
+
+def count_tokens_batch(texts: list[str]) -> list[int]:
+    """
+    Count the tokens of many text strings in a single tiktoken call.
+    The batch is encoded in parallel by tiktoken's native thread pool.
+    """
+    if tiktoken is None:
+        return [-1] * len(texts)
+    encoded = _get_encoding().encode_ordinary_batch(texts,
+                                                    num_threads=CPU_COUNT)
+    return [len(tokens) for tokens in encoded]
+
+
+# Per-thread scratch buffer for the binary check, so that sniffing many files
+# does not allocate a fresh bytes object for each one.
+_sniff_buffers = threading.local()
+
+
+def _get_sniff_buffer() -> bytearray:
+    """Return this thread's reusable READ_CHUNK_SIZE scratch buffer."""
+    buf = getattr(_sniff_buffers, 'buf', None)
+    if buf is None:
+        buf = _sniff_buffers.buf = bytearray(READ_CHUNK_SIZE)
+    return buf
+
+
+def has_non_text_extension(name: str) -> bool:
+    """Check if a file name has one of the NON_TEXT_EXTENSIONS (any case)."""
+    # Slicing the name directly is cheaper than Path.suffix, and most
+    # extensions are already lowercase so the lower() call is only needed on
+    # a miss.
+    dot = name.rfind('.')
+    if dot > 0:
+        ext = name[dot:]
+        return (ext in NON_TEXT_EXTENSIONS
+                or ext.lower() in NON_TEXT_EXTENSIONS)
+    return False
+
+
+def has_null_byte(data) -> bool:
+    """Check the first READ_CHUNK_SIZE bytes of data for a null byte."""
+    return data.find(b'\0', 0, READ_CHUNK_SIZE) != -1
 
 
 def is_likely_non_text(file_path: Path) -> bool:
@@ -295,25 +400,82 @@ def is_likely_non_text(file_path: Path) -> bool:
     Handles potential read errors (e.g., permission denied) gracefully.
     """
     # Check extension of file (case-insensitive)
-    if file_path.suffix.lower() in NON_TEXT_EXTENSIONS_SET:
+    if has_non_text_extension(file_path.name):
         return True
 
     # If extension isn't conclusive, check content for null bytes
     try:
-        with file_path.open('rb') as f:
-            chunk = f.read(READ_CHUNK_SIZE)
-            # Check if a null byte exists in the chunk read
-            # Empty files are considered not binary by this check
-            return b'\0' in chunk
+        buf = _get_sniff_buffer()
+        if hasattr(os, 'readv'):
+            # Raw os.open/os.readv skip the FileIO object and the fstat that
+            # Path.open() does, and still read straight into the reused buffer.
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                n = os.readv(fd, [buf])
+            finally:
+                os.close(fd)
+        else:  # Windows has no readv
+            with file_path.open('rb', buffering=0) as f:
+                n = f.readinto(buf)
+        # Check if a null byte exists in the chunk read
+        # Empty files are considered not binary by this check
+        return buf.find(b'\0', 0, n) != -1
     except PermissionError:
         print(f"Warning: Permission denied reading {file_path}",
               file=sys.stderr)
         return True  # Treat as non-text if we can't read it
 
 
-def should_ignore(file_path: Path, root_dir: Path, include_pattern: str,
-                  exclude_pattern: str,
-                  max_file_size_bytes: int) -> tuple[bool, str]:
+def compile_glob(pattern: str) -> re.Pattern:
+    """
+    Compile a glob pattern into a regex that matches exactly what
+    fnmatch.fnmatch(name, pattern) would, so it can be built once and reused
+    for every file instead of going through fnmatch on each call.
+    """
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile(fnmatch.translate(os.path.normcase(pattern)), flags)
+
+
+def exclude_prune_re(exclude_pattern: str,
+                     exclude_re: re.Pattern | None) -> re.Pattern | None:
+    """
+    Return exclude_re if it can be used to prune whole directories, else None.
+
+    When the pattern ends in '*' and matches 'some/dir' + os.sep, the final
+    '*' also matches anything appended after the separator, so every file
+    under that directory would be excluded and the walk can skip it. Other
+    patterns (e.g. 'build', which only matches the name itself) can't be used
+    this way.
+    """
+    if exclude_re is None or not exclude_pattern.endswith('*'):
+        return None
+    return exclude_re
+
+
+# errno values for which a failed stat() just means "not a file", mirroring
+# what Path.is_file() treats as a plain False rather than an error.
+_NOT_A_FILE_ERRNOS = (errno.ENOENT, errno.ENOTDIR, errno.EBADF, errno.ELOOP)
+
+
+def stat_or_none(file_path: Path) -> os.stat_result | None:
+    """Return os.stat() of a path (following symlinks), or None on error."""
+    try:
+        return os.stat(file_path)
+    except OSError:
+        return None
+
+
+def should_ignore(
+        file_path: Path,
+        root_dir: Path,
+        include_pattern: str,
+        exclude_pattern: str,
+        max_file_size_bytes: int,
+        stat_result: os.stat_result | None = None,
+        include_re: re.Pattern | None = None,
+        exclude_re: re.Pattern | None = None,
+        relative_path_str: str | None = None,
+        check_content: bool = True) -> tuple[bool, str]:
     """
     Check if a file should be ignored based on defined rules:
     - Not a file or inaccessible
@@ -324,16 +486,33 @@ def should_ignore(file_path: Path, root_dir: Path, include_pattern: str,
     - Matches the exclude pattern
     - Is likely binary.
 
+    stat_result can be passed when the caller already has the os.stat() of
+    file_path, to avoid statting the file again. Likewise include_re and
+    exclude_re can be the compile_glob() of the patterns, to avoid compiling
+    them for every file, and relative_path_str the path of file_path relative
+    to root_dir when the caller already knows it.
+
+    With check_content=False only the file extension is used to detect
+    binary files, and the file is not opened. The caller is then expected to
+    check the content itself, e.g. with read_file_content(skip_non_text=True).
+
     Returns a tuple (should_ignore, reason) where should_ignore is a boolean
     and reason is a string explaining why the file was ignored.
     """
     # 1. Check if it's actually a file (resolve symlinks first)
     try:
-        if not file_path.is_file():
-            # This might happen with broken symlinks during the walk
+        if stat_result is None:
+            try:
+                stat_result = os.stat(file_path)
+            except OSError as e:
+                if e.errno not in _NOT_A_FILE_ERRNOS:
+                    raise
+                # This might happen with broken symlinks during the walk
+                return True, f"{str(file_path.absolute())} is not a file"
+        if not stat.S_ISREG(stat_result.st_mode):
             return True, f"{str(file_path.absolute())} is not a file"
         # Check file size
-        file_size = file_path.stat().st_size
+        file_size = stat_result.st_size
         if file_size > max_file_size_bytes:
             logging.info(
                 f"Skipping large file {file_path.name} ({file_size} bytes > {max_file_size_bytes} bytes)",
@@ -346,38 +525,53 @@ def should_ignore(file_path: Path, root_dir: Path, include_pattern: str,
         return True, f"Could not check status of {file_path}: {e}"  # Ignore if we can't verify it's a file or get its size
 
     # Use relative path for hidden checks and pattern matching
-    try:
-        relative_path = file_path.relative_to(root_dir)
-        relative_path_str = str(relative_path)
-    except ValueError:
-        # Should not happen if file_path is within root_dir, but handle defensively
-        return True, f"Could not get relative path for {file_path} based on {root_dir}"
-
-    # 2. Check glob patterns
+    if relative_path_str is None:
+        try:
+            relative_path_str = str(file_path.relative_to(root_dir))
+        except ValueError:
+            # Should not happen if file_path is within root_dir, but handle defensively
+            return True, f"Could not get relative path for {file_path} based on {root_dir}"
+
+    # 2. Check glob patterns against the relative path and the file name.
+    # A pattern starting with '*' that matches the name also matches the
+    # relative path (the '*' absorbs the leading directories), so the name
+    # only needs its own check for other patterns. The same goes for files
+    # directly under root_dir, whose relative path is the name.
+    name = file_path.name
     # First check exclude pattern (if specified)
-    if exclude_pattern and (fnmatch.fnmatch(relative_path_str, exclude_pattern)
-                            or fnmatch.fnmatch(file_path.name,
-                                               exclude_pattern)):
-        return True, f"Matches exclude pattern {exclude_pattern}"
+    if exclude_pattern:
+        if exclude_re is None:
+            exclude_re = compile_glob(exclude_pattern)
+        if (exclude_re.match(relative_path_str)
+                or (not exclude_pattern.startswith('*')
+                    and relative_path_str != name and exclude_re.match(name))):
+            return True, f"Matches exclude pattern {exclude_pattern}"
 
     # Then check include pattern
-    if include_pattern != '*' and not fnmatch.fnmatch(
-            relative_path_str, include_pattern) and not fnmatch.fnmatch(
-                file_path.name, include_pattern):
-        return True, f"Does not match include pattern {include_pattern}"
+    if include_pattern != '*':
+        if include_re is None:
+            include_re = compile_glob(include_pattern)
+        if (not include_re.match(relative_path_str)
+                and (include_pattern.startswith('*')
+                     or relative_path_str == name
+                     or not include_re.match(name))):
+            return True, f"Does not match include pattern {include_pattern}"
 
     # 3. Check for hidden file/directory
     # Check filename itself
-    if file_path.name.startswith('.'):
+    if name.startswith('.'):
         return True, "Is a hidden file"
     # Check any parent directory component
-    # Use relative_path.parts to avoid checking parts outside the root_dir
-    # Check parent parts
-    if any(part.startswith('.') for part in relative_path.parts[:-1]):
+    # Use the relative path to avoid checking parts outside the root_dir.
+    # The name is known not to be hidden here, so a part starting with '.'
+    # at the front or after any separator must be a directory.
+    if (relative_path_str.startswith('.')
+            or (os.sep + '.') in relative_path_str):
         return True, "Is in a hidden directory"
 
     # 4. Check for binary content (can be slow, do last)
-    if is_likely_non_text(file_path):
+    if (is_likely_non_text(file_path) if check_content else
+            has_non_text_extension(file_path.name)):
         logging.info(f"Skipping likely non text file: {relative_path_str}",
                      file=sys.stderr)
         return True, "Is likely non text"
@@ -385,23 +579,67 @@ def should_ignore(file_path: Path, root_dir: Path, include_pattern: str,
     return False, "Not ignored"  # If none of the ignore conditions match
 
 
-def read_file_content(file_path: Path,
-                      root_dir: Path) -> tuple[str, str] | None:
+def read_file_bytes(file_path: Path, size_hint: int = 0) -> bytes:
+    """
+    Read a whole file with raw os.open/os.read calls, bypassing Python's
+    buffered and text IO layers. With an accurate size_hint (e.g. st_size)
+    the content arrives in a single read() syscall.
+    """
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        # Ask for one byte more than expected: a short read means we hit EOF
+        # and can skip the extra read() that would return b''.
+        request_size = max(size_hint, 0) + 1
+        chunks = []
+        while True:
+            chunk = os.read(fd, request_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if len(chunk) < request_size:
+                break
+            request_size = READ_CHUNK_SIZE
+        return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+    finally:
+        os.close(fd)
+
+
+def read_file_content(
+        file_path: Path,
+        root_dir: Path,
+        file_size: int = 0,
+        relative_path_str: str | None = None,
+        skip_non_text: bool = False) -> tuple[str, str] | None:
     """
     Reads the content of a text file.
+    file_size is the expected size in bytes (e.g. from a cached stat) and is
+    used to read the file in one go. relative_path_str is the path relative
+    to root_dir, computed here if not given.
+    If skip_non_text is True, the content read is checked for binary data the
+    same way is_likely_non_text does and None is returned for binary files.
+    This saves opening the file a second time just to sniff it.
     Returns a tuple (relative_path_str, content) or None if reading fails.
     """
     try:
-        try:
-            relative_path = file_path.relative_to(root_dir)
-            relative_path_str = str(relative_path)
-        except ValueError:
-            # Fallback for when file_path is not within root_dir,
-            # which can happen for explicitly passed files outside CWD.
-            relative_path_str = str(file_path)
-
-        with file_path.open('r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
+        if relative_path_str is None:
+            try:
+                relative_path_str = str(file_path.relative_to(root_dir))
+            except ValueError:
+                # Fallback for when file_path is not within root_dir,
+                # which can happen for explicitly passed files outside CWD.
+                relative_path_str = str(file_path)
+
+        data = read_file_bytes(file_path, file_size)
+        if skip_non_text and has_null_byte(data):
+            logging.info(f"Skipping likely non text file: {relative_path_str}")
+            return None
+        # Content is kept as str rather than passed through as bytes: the
+        # output drops invalid UTF-8, normalizes newlines and reports sizes in
+        # characters, and the UTF-8 codecs are cheap next to tokenizing.
+        content = data.decode('utf-8', errors='ignore')
+        # Match text-mode reads, which translate \r\n and \r to \n
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
         return (relative_path_str, content)
     except OSError as e:
         print(f"Warning: Could not read file {file_path}: {e}",
@@ -418,58 +656,121 @@ def read_file_content(file_path: Path,
         return None
 
 
-def read_files_parallel(files_to_process: list[tuple[Path,
-                                                     Path]], num_workers: int,
-                        paths_only: bool) -> list[tuple[str, str]]:
+def read_files_parallel(files_to_process: list[tuple[Path, Path, str,
+                                                     os.stat_result | None]],
+                        num_workers: int,
+                        paths_only: bool,
+                        skip_non_text: bool = False
+                        ) -> Iterator[tuple[str, str]]:
     """
     Read files in parallel using a thread pool.
-    Returns a list of tuples (relative_path_str, content).
+    files_to_process holds (absolute_path, root_dir, relative_path_str,
+    stat_result) tuples.
+    Yields tuples (relative_path_str, content) in the order of
+    files_to_process as soon as each one is available, so the caller can
+    write a file out and drop it while later files are still being read.
+    Files that can't be read are skipped, as are binary files when
+    skip_non_text is True (see read_file_content).
     If paths_only is True, content will be empty string.
     """
     if paths_only:
         # In paths-only mode, we don't need to read file contents
-        results = []
-        for abs_path, root_dir in files_to_process:
-            try:
-                relative_path = abs_path.relative_to(root_dir)
-                relative_path_str = str(relative_path)
-                results.append((relative_path_str, ""))
-            except Exception as e:
-                print(
-                    f"Warning: Could not get relative path for {abs_path}: {e}",
-                    file=sys.stderr)
-        return results
-
-    # Normal mode - read file contents in parallel
-    results = []
+        for _, _, relative_path_str, _ in files_to_process:
+            yield (relative_path_str, "")
+        return
+
+    # Normal mode - read file contents in parallel. Files are submitted in
+    # blocks, one block ahead of the one being yielded, so only about two
+    # blocks of content are held in memory no matter how large the tree is.
+    # Blocks are limited by file count and by READ_BLOCK_BYTES, so a run of
+    # large files doesn't make a block large too.
+    print(f"Reading {len(files_to_process)} files using {num_workers} workers",
+          file=sys.stderr)
+    block_size = max(64, num_workers * 4)
+    blocks = batched(files_to_process,
+                     block_size,
+                     READ_BLOCK_BYTES,
+                     size=lambda item: item[3].st_size if item[3] else 0)
     with concurrent.futures.ThreadPoolExecutor(
             max_workers=num_workers) as executor:
-        # Submit tasks
-        future_to_path = {
-            executor.submit(read_file_content, abs_path, root_dir):
-            (abs_path, root_dir)
-            for abs_path, root_dir in files_to_process
-        }
-
-        # Collect results as they complete
-        processed_count = 0
-        for future in concurrent.futures.as_completed(future_to_path):
-            abs_path, root_dir = future_to_path[future]
-            try:
-                result = future.result()
+
+        def submit_block(block: list) -> list:
+            submitted = []
+            for item in block:
+                abs_path, root_dir, relative_path_str, abs_stat = item
+                future = executor.submit(read_file_content, abs_path, root_dir,
+                                         abs_stat.st_size if abs_stat else 0,
+                                         relative_path_str, skip_non_text)
+                submitted.append((item, future))
+            return submitted
+
+        next_block = submit_block(next(blocks, []))
+        while next_block:
+            current_block = next_block
+            next_block = submit_block(next(blocks, []))
+            for i, ((abs_path, _, _, _), future) in enumerate(current_block):
+                # Drop our reference so the content can be freed once written
+                current_block[i] = None
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"\nError processing file {abs_path}: {e}",
+                          file=sys.stderr)
+                    continue
                 if result:
-                    results.append(result)
-                processed_count += 1
-                # Optional: Progress indicator
-                print(
-                    f"\rProcessed: {processed_count}/{len(files_to_process)}",
-                    end="",
-                    file=sys.stderr)
-            except Exception as e:
-                print(f"\nError processing file {abs_path}: {e}",
-                      file=sys.stderr)
+                    yield result
 
-    return results
+
+def iter_directory_files(
+    root_dir: Path,
+    prune_re: re.Pattern | None = None
+) -> Iterator[tuple[Path, str, os.stat_result | None]]:
+    """
+    Recursively yield (path, relative_path_str, stat_result) for every
+    non-directory entry under root_dir, walking the tree with os.scandir.
+    relative_path_str is path relative to root_dir, cut straight out of the
+    entry path instead of being recomputed with Path.relative_to().
+
+    Hidden directories are pruned instead of being descended into, since
+    everything inside them would be ignored anyway. Like Path.rglob, symlinks
+    to directories are not followed and unreadable directories are skipped.
+    stat_result follows symlinks and is None if the entry can't be stat'ed.
+
+    If prune_re is given, directories whose relative path plus a trailing
+    separator it matches are pruned too. Only pass a pattern for which that
+    match means every file below the directory matches as well, such as
+    exclude_prune_re() of an exclude pattern.
+    """
+    # With a trailing separator, every entry path starts with root_prefix
+    root_prefix = os.path.join(str(root_dir), '')
+    root_prefix_len = len(root_prefix)
+    stack = [root_prefix]
+    while stack:
+        try:
+            scandir_it = os.scandir(stack.pop())
+        except PermissionError:
+            continue
+        with scandir_it:
+            for entry in scandir_it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    name = entry.name
+                    if name.startswith('.'):
+                        continue
+                    if prune_re is not None and prune_re.match(
+                            entry.path[root_prefix_len:] + os.sep):
+                        continue
+                    stack.append(entry.path)
+                    continue
+                try:
+                    entry_stat = entry.stat()
+                except OSError:
+                    entry_stat = None
+                yield (Path(entry.path), entry.path[root_prefix_len:],
+                       entry_stat)
 
 
 def is_git_directory(dir_path: Path) -> bool:
@@ -477,21 +778,40 @@ def is_git_directory(dir_path: Path) -> bool:
     return (dir_path / ".git").exists()
 
 
-def list_files_in_git_directory(dir_path: Path) -> list[Path]:
+def list_files_in_git_directory(dir_path: Path) -> list[tuple[Path, str]]:
     """List all files in a git directory using git ls-files.
     
-    This makes sure we only list files that are actually tracked by git.
+    This makes sure we only list files that are actually tracked by git,
+    which also keeps out everything matched by .gitignore without walking
+    the tree. Returns (path, relative_path_str) tuples, relative to dir_path.
+    """
+    # -z gives NUL-separated raw paths; without it git quotes names that
+    # contain non-ASCII or special characters, which then don't exist on disk.
+    output = subprocess.check_output(['git', 'ls-files', '-z'], cwd=dir_path)
+    files = output.decode('utf-8', errors='surrogateescape').split('\0')[:-1]
+    if os.sep != '/':
+        files = [file.replace('/', os.sep) for file in files]
+    return [(dir_path / file, file) for file in files]
+
+
+def find_files(
+    input_paths_str: list[str],
+    include_pattern: str,
+    exclude_pattern: str,
+    max_file_size_bytes: int,
+    check_content: bool = True
+) -> list[tuple[Path, Path, str, os.stat_result | None]]:
+    """
+    Find the files to pack under the given input paths, applying the same
+    rules as should_ignore.
+    With check_content=False, files found in directories are not opened to
+    check for binary content, and the caller must skip binary files when
+    reading them (read_files_parallel with skip_non_text=True). Files passed
+    explicitly are always checked, so that a warning can be printed for them.
+    Returns a list of (absolute_path, root_dir, relative_path_str,
+    stat_result) tuples sorted by relative_path_str, the path relative to
+    root_dir, which is the order they are written in.
     """
-    files = subprocess.check_output(['git', 'ls-files'],
-                                    cwd=dir_path).decode('utf-8').splitlines()
-    return [dir_path / file for file in files]
-
-
-def collect_files_content(input_paths_str: list[str], include_pattern: str,
-                          exclude_pattern: str, max_file_size_bytes: int,
-                          num_workers: int, paths_only: bool,
-                          using_stdout: bool) -> list[tuple[str, str]]:
-
     cwd = Path('.').resolve()
 
     print(f"Processing paths: {', '.join(input_paths_str)}", file=sys.stderr)
@@ -501,56 +821,88 @@ def collect_files_content(input_paths_str: list[str], include_pattern: str,
         f"Ignoring hidden files/directories (within scanned dirs) and binary files.",
         file=sys.stderr)
     print(f"Maximum file size: {max_file_size_bytes:,} bytes", file=sys.stderr)
-    print(f"Using {num_workers} workers", file=sys.stderr)
     print(f"Current working directory: {cwd}", file=sys.stderr)
 
-    # (absolute_path, root_for_relative_path)
-    files_to_process_tuples: list[tuple[Path, Path]] = []
+    # Compile the glob patterns once for all files
+    include_re = compile_glob(include_pattern)
+    exclude_re = compile_glob(exclude_pattern) if exclude_pattern else None
+
+    # (absolute_path, root_for_relative_path, relative_path_str, stat_result)
+    files_to_process_tuples: list[tuple[Path, Path, str,
+                                        os.stat_result | None]] = []
     processed_files: set[Path] = set()  # Keep track of files added
 
     for path_str in input_paths_str:
         p = Path(path_str).resolve()
 
-        if not p.exists():
+        p_stat = stat_or_none(p)
+        if p_stat is None:
             raise ValueError(f"Input path not found: {path_str}")
 
         if p in processed_files:
             # Avoid processing the same resolved path twice if listed multiple times
             continue
 
-        if p.is_file():
-            item, root_dir = p, p.parent
+        if stat.S_ISREG(p_stat.st_mode):
+            item, root_dir, rel_path_str = p, p.parent, p.name
             should_ignore_result, reason = should_ignore(
-                item, root_dir, include_pattern, exclude_pattern,
-                max_file_size_bytes)
+                item,
+                root_dir,
+                include_pattern,
+                exclude_pattern,
+                max_file_size_bytes,
+                stat_result=p_stat,
+                include_re=include_re,
+                exclude_re=exclude_re,
+                relative_path_str=rel_path_str)
             if should_ignore_result:
                 print(f"Warning: Ignoring file {item} because {reason}",
                       file=sys.stderr)
                 continue
-            files_to_process_tuples.append((item, root_dir))
+            files_to_process_tuples.append(
+                (item, root_dir, rel_path_str, p_stat))
             processed_files.add(item)
         elif is_git_directory(p):
             print(f"Scanning git directory: {p}", file=sys.stderr)
-            for item in list_files_in_git_directory(p):
+            for item, rel_path_str in list_files_in_git_directory(p):
+                item_stat = stat_or_none(item)
                 should_ignore_result, reason = should_ignore(
-                    item, p, include_pattern, exclude_pattern,
-                    max_file_size_bytes)
+                    item,
+                    p,
+                    include_pattern,
+                    exclude_pattern,
+                    max_file_size_bytes,
+                    stat_result=item_stat,
+                    include_re=include_re,
+                    exclude_re=exclude_re,
+                    relative_path_str=rel_path_str,
+                    check_content=check_content)
                 if should_ignore_result:
                     continue
-                files_to_process_tuples.append((item, p))
+                files_to_process_tuples.append(
+                    (item, p, rel_path_str, item_stat))
                 processed_files.add(item)
-        elif p.is_dir():
+        elif stat.S_ISDIR(p_stat.st_mode):
             print(f"Scanning directory: {p}", file=sys.stderr)
-            # Use rglob for recursion
-            for item in p.rglob('*'):
+            for item, rel_path_str, item_stat in iter_directory_files(
+                    p, exclude_prune_re(exclude_pattern, exclude_re)):
                 if item in processed_files:
                     continue
                 should_ignore_result, reason = should_ignore(
-                    item, p, include_pattern, exclude_pattern,
-                    max_file_size_bytes)
+                    item,
+                    p,
+                    include_pattern,
+                    exclude_pattern,
+                    max_file_size_bytes,
+                    stat_result=item_stat,
+                    include_re=include_re,
+                    exclude_re=exclude_re,
+                    relative_path_str=rel_path_str,
+                    check_content=check_content)
                 if should_ignore_result:
                     continue
-                files_to_process_tuples.append((item, p))
+                files_to_process_tuples.append(
+                    (item, p, rel_path_str, item_stat))
                 processed_files.add(item)
         else:
             raise ValueError(
@@ -561,78 +913,136 @@ def collect_files_content(input_paths_str: list[str], include_pattern: str,
         f"Found {len(files_to_process_tuples)} potential files. Preparing list...",
         file=sys.stderr)
 
-    # Calculate relative paths and prepare for sorting
-    files_to_sort = []
-    for abs_path, root_for_rel in files_to_process_tuples:
-        try:
-            rel_path_str = str(abs_path.relative_to(root_for_rel))
-            files_to_sort.append((rel_path_str, abs_path, root_for_rel))
-        except ValueError:
-            print(
-                f"Warning: Could not compute relative path for {abs_path} based on {root_for_rel}. Using absolute path.",
-                file=sys.stderr)
-            # Fallback: Use absolute path string or just filename for sorting
-            files_to_sort.append((abs_path.name, abs_path, root_for_rel))
-
-    # Sort files based on the calculated relative path string
-    files_to_sort.sort(key=lambda item: item[0])
+    # Sort files in place based on the relative path string. sort() computes
+    # each key once up front, so comparisons are plain str comparisons.
+    files_to_process_tuples.sort(key=operator.itemgetter(2))
 
-    # Reconstruct the list of tuples in the sorted order for reading
-    sorted_files_info = [
-        (abs_path, root_for_rel)
-        for rel_path_str, abs_path, root_for_rel in files_to_sort
-    ]
+    return files_to_process_tuples
 
-    print(f"Processing {len(sorted_files_info)} files...", file=sys.stderr)
-
-    # --- Parallel Reading (Needs updated function call) ---
-    results = read_files_parallel(sorted_files_info, num_workers, paths_only)
-    # Newline after progress indicator
-    print("\nReading complete.", file=sys.stderr)
-
-    # --- Sort results by relative path (already done conceptually, but results format might change) ---
-    # The results from read_files_parallel should already contain the correct relative paths
-    # Let's ensure the sorting of the final results list remains
-    # Sort by relative_path_str returned by read_file_content
-    results.sort(key=lambda item: item[0])
 
+def collect_files_content(input_paths_str: list[str], include_pattern: str,
+                          exclude_pattern: str, max_file_size_bytes: int,
+                          num_workers: int, paths_only: bool,
+                          using_stdout: bool) -> list[tuple[str, str]]:
+    """
+    Find and read all files to pack under the given input paths.
+    Returns a list of (relative_path_str, content) tuples sorted by path.
+    main() streams the same pipeline into write_output instead, so that the
+    whole pack never has to be held in memory.
+    """
+    files_to_process = find_files(input_paths_str, include_pattern,
+                                  exclude_pattern, max_file_size_bytes)
+    results = list(
+        read_files_parallel(files_to_process, num_workers, paths_only))
+    print("Reading complete.", file=sys.stderr)
     return results
 
 
-def write_output(output_target: TextIO, results: list[tuple[str, str]],
-                 using_stdout: bool, output_tokens_size_only: bool) -> int:
+def write_output(output_target: TextIO,
+                 results: Iterable[tuple[str, str]],
+                 using_stdout: bool,
+                 output_tokens_size_only: bool,
+                 exact_tokens: bool = False,
+                 total_files: int | None = None) -> int:
     """
     Write the results to the output target.
-    Returns the total number of tokens of the output.
+    results can be any iterable of (relative_path_str, content) tuples, such
+    as the generator returned by read_files_parallel, in which case each file
+    is written as soon as it has been read. total_files is only used for the
+    progress indicator and defaults to len(results); it may be larger than
+    the number of files actually written if some are skipped while reading.
+    Returns the total number of tokens of the output. The total is estimated
+    from the output length unless exact_tokens is True, in which case the
+    output is tokenized with tiktoken.
     """
+    if total_files is None:
+        total_files = len(results)
     # --- Writing Output ---
     total_tokens_of_files = 0
     total_tokens_of_output = 0
+    total_chars_of_output = 0
+    batch_info = ""
+    # Output not yet written, and its length in characters
+    pieces = []
+    pending_chars = 0
     try:
         file_count = 0
-        total_files = len(results)
-        for relative_path, content in results:
-            file_info = f">>>> {relative_path}\n"
-            file_content = file_info + content
-            file_content_tokens = count_tokens(file_content)
-            total_tokens_of_files += file_content_tokens
+        # Work through the files in batches: tiktoken still gets many strings
+        # per call, while only one batch of content is held at a time.
+        # Batches are capped by content size as well as by file count.
+        for batch in batched(results,
+                             TOKENIZE_BATCH_SIZE,
+                             TOKENIZE_BATCH_CHARS,
+                             size=lambda result: len(result[1])):
+            # A failure can only be pinned down to the batch, not one file
+            if len(batch) == 1:
+                batch_info = batch[0][0]
+            else:
+                batch_info = f"files {batch[0][0]} to {batch[-1][0]}"
             if output_tokens_size_only:
-                to_write = (
-                    file_info +
-                    f"{file_content_tokens} tokens, {len(file_content)} bytes\n"
-                )
+                file_tokens = count_tokens_batch([
+                    f">>>> {relative_path}\n{content}"
+                    for relative_path, content in batch
+                ])
             else:
-                to_write = file_content
-            output_target.write(to_write)
-            output_target.write('\n')
-            total_tokens_of_output += count_tokens(to_write)
-            output_target.flush()  # Flush periodically for long outputs
-            file_count += 1
-            # Show progress as percentage
-            percentage = (file_count / total_files) * 100
-            print(f"\rWriting: {percentage:.1f}%", end="", file=sys.stderr)
+                file_tokens = [0] * len(batch)
+            written = []
+            for (relative_path, content), file_content_tokens in zip(
+                    batch, file_tokens):
+                file_info = f">>>> {relative_path}\n"
+                total_tokens_of_files += file_content_tokens
+                if output_tokens_size_only:
+                    to_write = [
+                        file_info +
+                        f"{file_content_tokens} tokens, "
+                        f"{len(file_info) + len(content)} bytes\n"
+                    ]
+                else:
+                    # Header and content are written as they are, without
+                    # being copied into one string per file
+                    to_write = [file_info, content]
+                for piece in to_write:
+                    if len(piece) >= WRITE_BUFFER_CHARS:
+                        # Large content goes out directly rather than
+                        # being copied once more by the join below
+                        output_target.write(''.join(pieces))
+                        pieces.clear()
+                        pending_chars = 0
+                        output_target.write(piece)
+                    else:
+                        pieces.append(piece)
+                        pending_chars += len(piece)
+                    total_chars_of_output += len(piece)
+                    if exact_tokens:
+                        written.append(piece)
+                    else:
+                        total_tokens_of_output += estimate_tokens(piece)
+                pieces.append('\n')
+                pending_chars += 1
+                total_chars_of_output += 1
+                # Small pieces are gathered and written together once they
+                # add up to WRITE_BUFFER_CHARS
+                if pending_chars >= WRITE_BUFFER_CHARS:
+                    output_target.write(''.join(pieces))
+                    pieces.clear()
+                    pending_chars = 0
+                file_count += 1
+                # Show progress as percentage. The output buffer is left to
+                # flush itself, and progress is only printed every
+                # PROGRESS_INTERVAL files, to keep syscalls off the hot path.
+                if file_count % PROGRESS_INTERVAL == 0:
+                    percentage = (file_count / total_files) * 100
+                    print(f"\rWriting: {percentage:.1f}%",
+                          end="",
+                          file=sys.stderr)
+            # Tokenize what was written once per batch instead of per file
+            if exact_tokens:
+                total_tokens_of_output += sum(count_tokens_batch(written))
+        output_target.write(''.join(pieces))
+        if file_count:
+            print("\rWriting: 100.0%", end="", file=sys.stderr)
     except Exception as e:
-        print(f"\nError writing output for {file_info}: {e}", file=sys.stderr)
+        print(f"\nError writing output for {batch_info}: {e}", file=sys.stderr)
         # Avoid traceback flood if stdout pipe is broken
         if isinstance(e, BrokenPipeError):
             sys.exit(0)  # Exit cleanly if pipe is broken
@@ -649,8 +1059,11 @@ def write_output(output_target: TextIO, results: list[tuple[str, str]],
 
     print(f"\nSuccessfully combined content of {file_count} files.",
           file=sys.stderr)
-    print(f"Total tokens (approximate): {total_tokens_of_output:,}",
-          file=sys.stderr)
+    print(f"Total size: {total_chars_of_output:,} characters", file=sys.stderr)
+    print(
+        f"Total tokens ({'exact' if exact_tokens else 'estimated'}): "
+        f"{total_tokens_of_output:,}",
+        file=sys.stderr)
     return total_tokens_of_output
 
 
@@ -767,6 +1180,14 @@ def main(argv: list[str]):
         "This is useful for gauging the size of the output and come up with a strategy for "
         "selective packing, such as using a smaller model or a smaller context window."
     )
+    parser.add_argument(
+        "--exact-tokens",
+        action="store_true",
+        help=
+        "Count the tokens of the packed output exactly with tiktoken instead of "
+        "estimating them from the output length (about 4 characters per token). "
+        "Exact counting can take longer than the packing itself on large outputs."
+    )
 
     args = parser.parse_args(argv[1:])
 
@@ -798,20 +1219,26 @@ def main(argv: list[str]):
         using_stdout = True
 
     try:
-        results = collect_files_content(
+        files_to_process = find_files(
             input_paths_str=input_paths_str,
             include_pattern=include_pattern,
             exclude_pattern=exclude_pattern,
             max_file_size_bytes=max_file_size_bytes,
-            num_workers=num_workers,
-            paths_only=paths_only,
-            using_stdout=using_stdout)
+            # When the files are read anyway, the binary check is done on
+            # the content read instead of opening every file twice.
+            check_content=paths_only)
 
+        # Files are written out as they are read rather than collected first
         total_tokens_of_output = write_output(
             output_target=output_target,
-            results=results,
+            results=read_files_parallel(files_to_process,
+                                        num_workers,
+                                        paths_only,
+                                        skip_non_text=not paths_only),
             using_stdout=using_stdout,
-            output_tokens_size_only=args.output_tokens_size_only)
+            output_tokens_size_only=args.output_tokens_size_only,
+            exact_tokens=args.exact_tokens,
+            total_files=len(files_to_process))
         if total_tokens_of_output > 800000 and args.output_tokens_size_only is False:
             print_warning_about_large_output(
                 total_tokens_of_output=total_tokens_of_output, argv=argv)
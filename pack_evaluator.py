@@ -11,10 +11,11 @@ Metrics:
 - combined_score: correctness_score * speed_score.
 """
 
+import difflib
 import subprocess
 import time
 import os
-import tempfile
+import sys
 import traceback
 from pathlib import Path
 from openevolve.evaluation_result import EvaluationResult
@@ -28,6 +29,20 @@ GOLDEN_FILE = os.path.join(BENCHMARK_DIR,
 # Max time allowed for the pack.py script itself to run
 EVALUATION_TIMEOUT = 60 # 60 seconds
 
+# Golden file content, reused across evaluations until the file changes
+_golden_cache = {"mtime_ns": None, "size": None, "content": None}
+
+
+def _get_golden_output(golden_path):
+    """Return the golden file's bytes, re-reading it only if it has changed."""
+    st = os.stat(golden_path)
+    if (_golden_cache["mtime_ns"] != st.st_mtime_ns
+            or _golden_cache["size"] != st.st_size):
+        _golden_cache["content"] = golden_path.read_bytes()
+        _golden_cache["mtime_ns"] = st.st_mtime_ns
+        _golden_cache["size"] = st.st_size
+    return _golden_cache["content"]
+
 def _create_error_result(e, stage="main", stderr=None, diff=None):
     """Helper function to create a standardized EvaluationResult for errors."""
     error_type = type(e).__name__
@@ -37,6 +52,17 @@ def _create_error_result(e, stage="main", stderr=None, diff=None):
         stderr = e.stderr
     if diff is None and hasattr(e, 'stdout'): # diff might be in stdout
         diff = e.stdout
+    # Output captured from the candidate is bytes
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode('utf-8', errors='ignore')
+    if isinstance(diff, bytes):
+        diff = diff.decode('utf-8', errors='ignore')
+    # Errors built for pre-run checks or crashes were never raised, so there
+    # is no traceback to format for them.
+    if sys.exc_info()[0] is not None:
+        full_traceback = traceback.format_exc()
+    else:
+        full_traceback = "N/A"
 
     return EvaluationResult(
         metrics={
@@ -50,7 +76,7 @@ def _create_error_result(e, stage="main", stderr=None, diff=None):
             "status": "Error",
             "error_type": error_type,
             "error_message": error_message,
-            "full_traceback": traceback.format_exc(),
+            "full_traceback": full_traceback,
             "stderr": stderr[:1000] if stderr else "N/A",
             "diff": diff[:1000] if diff else "N/A",
         }
@@ -69,15 +95,14 @@ def _run_evaluation(program_path):
     if not golden_path.is_file():
         return _create_error_result(FileNotFoundError(f"Golden file not found: {GOLDEN_FILE}"))
 
-    # Create a temporary file to store the script's output for diffing
-    # We use a named file path that we can pass to `diff`
-    with tempfile.NamedTemporaryFile(delete=False, mode='w', encoding='utf-8') as temp_out:
-        output_path = temp_out.name
-
     try:
         # --- 2. Run the candidate program ---
         # The pack.py script writes to stdout when not in a TTY,
-        # so we capture stdout.
+        # so we capture stdout. It is kept as bytes: comparing bytes with the
+        # golden file needs no decoding, which only happens for the diff
+        # when the outputs differ. The candidate keeps running in its own
+        # process: the timeout can kill it, a crash or sys.exit() can't take
+        # the evaluator down, and no module state carries over between runs.
         cmd = ["python3", program_path, str(folder_to_pack)]
 
         start_time = time.monotonic()
@@ -85,11 +110,10 @@ def _run_evaluation(program_path):
         proc = subprocess.run(
             cmd,
             capture_output=True, # Capture stdout and stderr
-            text=True,
             timeout=EVALUATION_TIMEOUT,
-            encoding='utf-8',
-            errors='ignore' # Avoid decode errors from potential garbage in stderr
         )
+        # Avoid decode errors from potential garbage in stderr
+        stderr = proc.stderr.decode('utf-8', errors='ignore')
 
         end_time = time.monotonic()
         execution_time = end_time - start_time
@@ -98,27 +122,31 @@ def _run_evaluation(program_path):
         if proc.returncode != 0:
             return _create_error_result(
                 Exception(f"Script crashed with return code {proc.returncode}"),
-                stderr=proc.stderr
+                stderr=stderr
             )
 
-        # Write the captured stdout to our temp file for diffing
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(proc.stdout)
-
-        # --- 3. Run diff for correctness check ---
-        diff_cmd = ["diff", "-u", str(golden_path), output_path]
-
-        diff_proc = subprocess.run(
-            diff_cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8'
-        )
-
-        diff_output = diff_proc.stdout
-
-        # Correctness is binary: 1.0 if files are identical (no diff), 0.0 otherwise
-        correctness_score = 1.0 if not diff_output else 0.0
+        # --- 3. Compare against the golden file for correctness ---
+        # Compared in memory instead of writing a temp file and running
+        # `diff`; the unified diff is only built when the outputs differ.
+        golden_output = _get_golden_output(golden_path)
+        if proc.stdout == golden_output:
+            diff_output = ""
+        else:
+            diff_output = "".join(difflib.unified_diff(
+                golden_output.decode('utf-8', errors='ignore').splitlines(
+                    keepends=True),
+                proc.stdout.decode('utf-8', errors='ignore').splitlines(
+                    keepends=True),
+                fromfile=str(golden_path),
+                tofile="output"))
+            # The diff drops undecodable bytes, so it can come out empty
+            # even though the outputs differ
+            if not diff_output:
+                diff_output = "outputs differ in undecodable bytes"
+
+        # Correctness is binary: 1.0 if the outputs are byte-identical,
+        # 0.0 otherwise
+        correctness_score = 1.0 if proc.stdout == golden_output else 0.0
 
         # --- 4. Calculate scores ---
 
@@ -141,7 +169,7 @@ def _run_evaluation(program_path):
                 "status": "Success" if correctness_score == 1.0 else "DiffMismatch",
                 "execution_time_s": f"{execution_time:.4f}",
                 # Include stderr for debugging (e.g., "Processed X files...")
-                "stderr": proc.stderr[:1000],
+                "stderr": stderr[:1000],
                 # Include the first 2000 chars of the diff, if any
                 "diff": diff_output[:2000]
             }
@@ -151,10 +179,6 @@ def _run_evaluation(program_path):
         return _create_error_result(e, stderr="Process timed out.")
     except Exception as e:
         return _create_error_result(e)
-    finally:
-        # Clean up the temp file
-        if os.path.exists(output_path):
-            os.remove(output_path)
 
 
 
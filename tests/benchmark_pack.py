@@ -1,22 +1,37 @@
 # test_pack_perf.py
 import time
 import subprocess
+import concurrent.futures
+import contextlib
+import io
 import tempfile
 import os
 from pathlib import Path
 import sys
 
+sys.path.insert(0, os.path.join(
+    os.path.abspath(os.path.dirname(__file__)), ".."))
+
+import pack
+
 def setup_performance_test_directory(base_dir, num_files, file_size_kb):
     """Creates a directory structure with many files for testing."""
     print(f"Setting up test directory with {num_files} files of {file_size_kb}KB each...")
     base_path = Path(base_dir)
-    content = "a" * (file_size_kb * 1024)
-    
-    for i in range(num_files):
-        # Distribute files into subdirectories to avoid having too many files in one dir
-        subdir = base_path / f"subdir_{i % 10}"
+    content = b"a" * (file_size_kb * 1024)
+
+    # Distribute files into subdirectories to avoid having too many files in one dir
+    subdirs = [base_path / f"subdir_{k}" for k in range(10)]
+    for subdir in subdirs:
         subdir.mkdir(exist_ok=True)
-        (subdir / f"file_{i}.txt").write_text(content)
+
+    def write_file(i):
+        (subdirs[i % 10] / f"file_{i}.txt").write_bytes(content)
+
+    # The writes are independent and IO-bound, so keep many in flight
+    with concurrent.futures.ThreadPoolExecutor(max_workers=32) as executor:
+        # list() re-raises any error from the writes
+        list(executor.map(write_file, range(num_files)))
     print("Setup complete.")
 
 def run_benchmark(description, command_args):
@@ -44,6 +59,43 @@ def run_benchmark(description, command_args):
     print(f"Execution Time: {duration:.4f} seconds\n")
     return duration
 
+def run_in_process_benchmark(description, command_args):
+    """
+    Runs pack.main() in this process with given args and measures time.
+    Unlike run_benchmark, the time does not include starting an interpreter
+    and importing pack, so it only reflects the cost of packing itself.
+    """
+    argv = ["pack.py"] + command_args + ["-o", os.devnull]
+
+    print(f"--- Running in-process: {description} ---")
+    stderr = io.StringIO()
+    start_time = time.perf_counter()
+    try:
+        # Suppress pack's progress output during benchmark
+        with contextlib.redirect_stderr(stderr):
+            pack.main(argv)
+    except SystemExit as e:
+        if e.code:
+            print(f"Error running pack for '{description}'")
+            print(f"Stderr: {stderr.getvalue()}")
+            return float('inf')
+    end_time = time.perf_counter()
+
+    duration = end_time - start_time
+    print(f"Execution Time: {duration:.4f} seconds\n")
+    return duration
+
+def run_scenario(scenario_dir):
+    """Benchmarks packing scenario_dir with different numbers of workers."""
+    # One full command line run, including interpreter startup
+    run_benchmark("End-to-end (default workers)", [str(scenario_dir)])
+
+    run_in_process_benchmark("Baseline (1 worker)", [str(scenario_dir), '--workers', '1'])
+    run_in_process_benchmark("Parallel (2 workers)", [str(scenario_dir), '--workers', '2'])
+    run_in_process_benchmark("Parallel (4 workers)", [str(scenario_dir), '--workers', '4'])
+    if os.cpu_count() and os.cpu_count() > 4:
+        run_in_process_benchmark(f"Parallel ({os.cpu_count()} workers)", [str(scenario_dir), '--workers', str(os.cpu_count())])
+
 def main():
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp_path = Path(tmpdir)
@@ -53,12 +105,7 @@ def main():
         scenario1_dir = tmp_path / "scenario1"
         scenario1_dir.mkdir()
         setup_performance_test_directory(scenario1_dir, num_files=1000, file_size_kb=4)
-
-        run_benchmark("Baseline (1 worker)", [str(scenario1_dir), '--workers', '1'])
-        run_benchmark("Parallel (2 workers)", [str(scenario1_dir), '--workers', '2'])
-        run_benchmark("Parallel (4 workers)", [str(scenario1_dir), '--workers', '4'])
-        if os.cpu_count() and os.cpu_count() > 4:
-            run_benchmark(f"Parallel ({os.cpu_count()} workers)", [str(scenario1_dir), '--workers', str(os.cpu_count())])
+        run_scenario(scenario1_dir)
         
         print("\n" + "="*60 + "\n")
 
@@ -67,12 +114,7 @@ def main():
         scenario2_dir = tmp_path / "scenario2"
         scenario2_dir.mkdir()
         setup_performance_test_directory(scenario2_dir, num_files=50, file_size_kb=1024)
-
-        run_benchmark("Baseline (1 worker)", [str(scenario2_dir), '--workers', '1'])
-        run_benchmark("Parallel (2 workers)", [str(scenario2_dir), '--workers', '2'])
-        run_benchmark("Parallel (4 workers)", [str(scenario2_dir), '--workers', '4'])
-        if os.cpu_count() and os.cpu_count() > 4:
-            run_benchmark(f"Parallel ({os.cpu_count()} workers)", [str(scenario2_dir), '--workers', str(os.cpu_count())])
+        run_scenario(scenario2_dir)
 
 
 if __name__ == "__main__":
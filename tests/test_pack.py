@@ -1,12 +1,13 @@
 # test_pack.py
 import unittest
 import argparse
+import contextlib
+import io
 import sys
 import os
 import tempfile
 import subprocess
 from pathlib import Path
-import shutil
 
 # Add the parent directory to the path so we can import pack
 sys.path.insert(0, os.path.join(
@@ -28,6 +29,27 @@ class TestUnitFunctions(unittest.TestCase):
         with self.assertRaises(ValueError):
             pack.parse_size('10X')
 
+    def test_batched(self):
+        self.assertEqual(list(pack.batched(range(5), 2)),
+                         [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(pack.batched([], 2)), [])
+        # A batch is closed once its items reach max_size, and an item
+        # larger than max_size gets a batch of its own
+        sizes = [1, 1, 5, 1, 2, 1]
+        self.assertEqual(
+            list(pack.batched(sizes, 3, max_size=3, size=lambda x: x)),
+            [[1, 1, 5], [1, 2], [1]])
+        self.assertEqual(
+            list(pack.batched([5, 1], 3, max_size=3, size=lambda x: x)),
+            [[5], [1]])
+
+    @unittest.skipIf(pack.tiktoken is None, "tiktoken is not installed")
+    def test_count_tokens_batch(self):
+        texts = [">>>> a.py\nprint('hi')\n", "", "x <|endoftext|> y"]
+        self.assertEqual(pack.count_tokens_batch(texts),
+                         [pack.count_tokens(text) for text in texts])
+        self.assertEqual(pack.count_tokens_batch([]), [])
+
     def test_is_likely_non_text(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             p = Path(tmpdir)
@@ -43,6 +65,11 @@ class TestUnitFunctions(unittest.TestCase):
                 f.write(b'hello\0world')
             self.assertTrue(pack.is_likely_non_text(null_byte_file))
 
+            # Test case 2b: Text header followed by binary data
+            late_null_file = p / "late_null.txt"
+            late_null_file.write_bytes(b'a' * 2000 + b'\0')
+            self.assertTrue(pack.is_likely_non_text(late_null_file))
+
             # Test case 3: Standard text file
             text_file = p / "text.txt"
             text_file.write_text("hello world")
@@ -53,6 +80,30 @@ class TestUnitFunctions(unittest.TestCase):
             empty_file.touch()
             self.assertFalse(pack.is_likely_non_text(empty_file))
 
+    def test_read_file_content(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root_dir = Path(tmpdir)
+            file_path = root_dir / "mixed.txt"
+            file_path.write_bytes(b'one\r\ntwo\rthree\n\xff\xfecaf\xc3\xa9\n')
+
+            # Same result as a text-mode read: universal newlines and
+            # undecodable bytes dropped, whether or not the size is known.
+            expected = ("mixed.txt", "one\ntwo\nthree\ncafé\n")
+            self.assertEqual(pack.read_file_content(file_path, root_dir),
+                             expected)
+            self.assertEqual(
+                pack.read_file_content(file_path, root_dir,
+                                       file_path.stat().st_size), expected)
+
+            # With skip_non_text, binary content is rejected from the same read
+            null_file = root_dir / "null.txt"
+            null_file.write_bytes(b'hello\0world')
+            self.assertIsNone(
+                pack.read_file_content(null_file, root_dir, skip_non_text=True))
+            self.assertEqual(
+                pack.read_file_content(file_path, root_dir, skip_non_text=True),
+                expected)
+
     def test_should_ignore(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             root_dir = Path(tmpdir)
@@ -63,6 +114,7 @@ class TestUnitFunctions(unittest.TestCase):
             (root_dir / "src").mkdir()
             (root_dir / "src" / "main.py").write_text("print('hello')")
             (root_dir / "src" / "main_test.py").write_text("assert True")
+            (root_dir / "src" / "main_py.txt").write_text("notes")
             (root_dir / ".env").write_text("SECRET=123")
             large_file = root_dir / "large.log"
             large_file.write_text("a" * 2000) # 2000 bytes
@@ -107,11 +159,107 @@ class TestUnitFunctions(unittest.TestCase):
             self.assertFalse(should_ignore_result)
             self.assertEqual(reason, "Not ignored")
 
+            # A pattern without a leading '*' also matches the file name
+            should_ignore_result, reason = pack.should_ignore(root_dir / "src" / "main.py", root_dir, "*", "main.py", 5000)
+            self.assertTrue(should_ignore_result)
+            self.assertIn("Matches exclude pattern", reason)
+
+            should_ignore_result, reason = pack.should_ignore(root_dir / "src" / "main_py.txt", root_dir, "*", "main.py", 5000)
+            self.assertFalse(should_ignore_result)
+            self.assertEqual(reason, "Not ignored")
+
+            should_ignore_result, reason = pack.should_ignore(root_dir / "src" / "main.py", root_dir, "main.py", "", 5000)
+            self.assertFalse(should_ignore_result)
+            self.assertEqual(reason, "Not ignored")
+
+            should_ignore_result, reason = pack.should_ignore(root_dir / "src" / "main_py.txt", root_dir, "main.py", "", 5000)
+            self.assertTrue(should_ignore_result)
+            self.assertIn("Does not match include pattern", reason)
+
             # Test Case 6: Likely binary file
             should_ignore_result, reason = pack.should_ignore(binary_file, root_dir, "*", "", 5000)
             self.assertTrue(should_ignore_result)
             self.assertEqual(reason, "Is likely non text")
 
+            # Without check_content, only the extension is used
+            null_file = root_dir / "null.txt"
+            null_file.write_bytes(b'hello\0world')
+            should_ignore_result, reason = pack.should_ignore(
+                binary_file, root_dir, "*", "", 5000, check_content=False)
+            self.assertTrue(should_ignore_result)
+            should_ignore_result, reason = pack.should_ignore(
+                null_file, root_dir, "*", "", 5000, check_content=False)
+            self.assertFalse(should_ignore_result)
+
+    def test_list_files_in_git_directory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root_dir = Path(tmpdir)
+            (root_dir / "src").mkdir()
+            (root_dir / "src" / "main.py").write_text("main")
+            (root_dir / "café notes.txt").write_text("notes")
+            (root_dir / "untracked.txt").write_text("untracked")
+            subprocess.run(['git', 'init'], cwd=root_dir, check=True,
+                           capture_output=True)
+            subprocess.run(['git', 'add', 'src', 'café notes.txt'],
+                           cwd=root_dir, check=True, capture_output=True)
+
+            files = pack.list_files_in_git_directory(root_dir)
+            # Non-ASCII names come back unquoted, so the paths exist
+            self.assertEqual(
+                sorted(rel for _, rel in files),
+                ["café notes.txt", os.path.join("src", "main.py")])
+            for path, _ in files:
+                self.assertTrue(path.is_file())
+
+    def test_iter_directory_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root_dir = Path(tmpdir)
+            (root_dir / "src").mkdir()
+            (root_dir / "src" / "main.py").write_text("print('hello')")
+            (root_dir / ".git").mkdir()
+            (root_dir / ".git" / "config").write_text("git config")
+            (root_dir / ".env").write_text("SECRET=123")
+            # __pycache__ is walked like any other directory: .pyc files are
+            # skipped by extension later, but other files in it are packed.
+            (root_dir / "src" / "__pycache__").mkdir()
+            (root_dir / "src" / "__pycache__" / "notes.txt").write_text("notes")
+            os.symlink(root_dir / "src", root_dir / "src_link")
+
+            found = {}
+            for path, rel_path_str, path_stat in pack.iter_directory_files(
+                    root_dir):
+                self.assertEqual(rel_path_str, str(path.relative_to(root_dir)))
+                found[rel_path_str] = path_stat
+
+            # Hidden directories are pruned, hidden files are still yielded
+            # (should_ignore filters them), and symlinked directories are
+            # yielded as entries but not descended into.
+            self.assertEqual(sorted(found), [
+                ".env", "src/__pycache__/notes.txt", "src/main.py", "src_link"
+            ])
+            self.assertEqual(found["src/main.py"].st_size, len("print('hello')"))
+
+    def test_iter_directory_files_prunes_excluded_directories(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root_dir = Path(tmpdir)
+            (root_dir / "src").mkdir()
+            (root_dir / "src" / "main.py").write_text("main")
+            (root_dir / "build").mkdir()
+            (root_dir / "build" / "out.py").write_text("out")
+            (root_dir / "build.py").write_text("build")
+
+            exclude_re = pack.compile_glob("build*")
+            prune_re = pack.exclude_prune_re("build*", exclude_re)
+            found = sorted(rel for _, rel, _ in pack.iter_directory_files(
+                root_dir, prune_re))
+            # build/ is never entered; build.py is left to should_ignore
+            self.assertEqual(found, ["build.py", "src/main.py"])
+
+            # A pattern without a trailing '*' only matches the name itself
+            self.assertIsNone(
+                pack.exclude_prune_re("build", pack.compile_glob("build")))
+            self.assertIsNone(pack.exclude_prune_re("", None))
+
 class TestIntegration(unittest.TestCase):
     def setUp(self):
         self.tmpdir = tempfile.TemporaryDirectory()
@@ -173,6 +321,21 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(results[0][0], "src/main.py")
         self.assertEqual(results[0][1], "main content")
 
+    def test_read_files_parallel_keeps_order(self):
+        # Enough files to span several read-ahead blocks
+        many_dir = self.root_dir / "many"
+        many_dir.mkdir()
+        for i in range(150):
+            (many_dir / f"file_{i:03d}.txt").write_text(f"content {i}")
+
+        files_to_process = pack.find_files([str(many_dir)], "*", "", 10000)
+        results = pack.read_files_parallel(files_to_process,
+                                           num_workers=4,
+                                           paths_only=False)
+
+        self.assertEqual(list(results), [(f"file_{i:03d}.txt", f"content {i}")
+                                         for i in range(150)])
+
     def test_collect_files_content_mixed_input(self):
         another_txt_file = self.root_dir / "another_file.txt"
         another_txt_file.write_text("another content")
@@ -228,13 +391,38 @@ class TestE2EFunctional(unittest.TestCase):
     def tearDown(self):
         self.tmpdir.cleanup()
 
-    def run_pack(self, args, cwd):
+    def run_pack_subprocess(self, args, cwd):
         command = [str(self.pack_script_path)] + args
         return subprocess.run(command, cwd=cwd, capture_output=True, text=True, check=False)
 
+    def run_pack(self, args, cwd):
+        """
+        Run pack.main() in this process, from cwd, with stdout and stderr
+        captured. StringIO is not a tty, so pack writes to stdout as it does
+        when piped. Returns a CompletedProcess like run_pack_subprocess().
+        """
+        stdout, stderr = io.StringIO(), io.StringIO()
+        returncode = 0
+        old_cwd = os.getcwd()
+        os.chdir(cwd)
+        try:
+            with contextlib.redirect_stdout(stdout), \
+                    contextlib.redirect_stderr(stderr):
+                pack.main(["pack"] + args)
+        except SystemExit as e:
+            if e.code is None:
+                returncode = 0
+            else:
+                returncode = e.code if isinstance(e.code, int) else 1
+        finally:
+            os.chdir(old_cwd)
+        return subprocess.CompletedProcess(["pack"] + args, returncode,
+                                           stdout.getvalue(), stderr.getvalue())
+
     def test_piped_output_to_stdout(self):
-        # subprocess.run with capture_output=True makes stdout not a tty.
-        result = self.run_pack([], cwd=self.project_dir)
+        # Goes through the real launcher: subprocess.run with
+        # capture_output=True makes stdout not a tty.
+        result = self.run_pack_subprocess([], cwd=self.project_dir)
         self.assertEqual(result.returncode, 0)
         
         output_file = self.project_dir / "output.txt"
@@ -271,6 +459,17 @@ test content
         self.assertIn("main.py", content)
         self.assertNotIn("test_main.py", content)
 
+    def test_argument_handling_exclude_name(self):
+        (self.project_dir / "src" / "main_py.txt").write_text("notes")
+        subprocess.run(['git', 'add', 'src/main_py.txt'], cwd=self.project_dir,
+                       check=True, capture_output=True)
+        result = self.run_pack(["-e", "main.py"], cwd=self.project_dir)
+        self.assertEqual(result.returncode, 0)
+        content = result.stdout
+        self.assertNotIn(">>>> src/main.py", content)
+        self.assertIn(">>>> src/main_py.txt", content)
+        self.assertIn(">>>> src/utils.py", content)
+
     def test_max_file_size(self):
         result = self.run_pack(["--max-file-size", "100"], cwd=self.project_dir)
         self.assertEqual(result.returncode, 0)
@@ -287,6 +486,26 @@ test content
         self.assertNotIn("main content", content)
         self.assertNotIn("readme content", content)
 
+    @unittest.skipIf(pack.tiktoken is None, "tiktoken is not installed")
+    def test_total_tokens(self):
+        header = ">>>> main.py\n"
+        result = self.run_pack(["src/main.py"], cwd=self.project_dir)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, header + "main content\n")
+        # By default the total is estimated at 4 characters per token
+        self.assertIn(
+            "Total tokens (estimated): "
+            f"{len(header) // 4 + len('main content') // 4:,}",
+            result.stderr)
+
+        result = self.run_pack(["--exact-tokens", "src/main.py"],
+                               cwd=self.project_dir)
+        self.assertEqual(result.returncode, 0)
+        self.assertIn(
+            "Total tokens (exact): "
+            f"{pack.count_tokens(header) + pack.count_tokens('main content'):,}",
+            result.stderr)
+
     def test_output_tokens_size_only(self):
         # This test assumes tiktoken might not be installed, which is fine.
         result = self.run_pack(["--output-tokens-size-only"], cwd=self.project_dir)
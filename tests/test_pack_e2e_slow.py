@@ -1,3 +1,5 @@
+import filecmp
+import itertools
 import os
 import shutil
 import subprocess
@@ -20,13 +22,68 @@ class NonTTYStringIO(io.StringIO):
         return False
 
 
+GOLDEN_DIR = Path(__file__).parent / "golden_files"
+
+
+def _normalized_lines(path):
+    """
+    Yield the lines of a text file with surrounding whitespace stripped,
+    skipping blank lines at the start and end of the file. This is the same
+    as [line.strip() for line in text.strip().splitlines()], but streamed.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line.strip() for raw in f for line in raw.splitlines())
+        blank_run = 0
+        for line in itertools.dropwhile(lambda line: not line, lines):
+            if not line:
+                # Only emit blank lines once a non-blank line follows them
+                blank_run += 1
+                continue
+            yield from itertools.repeat('', blank_run)
+            blank_run = 0
+            yield line
+
+
+def _first_mismatch(actual_path, expected_path):
+    """
+    Compare two files line by line after normalizing them with
+    _normalized_lines, stopping at the first difference.
+    Returns (line_number, actual_line, expected_line) for the first line that
+    differs, with None for a missing line, or None if the files match.
+    """
+    pairs = itertools.zip_longest(_normalized_lines(actual_path),
+                                  _normalized_lines(expected_path))
+    for line_number, (actual, expected) in enumerate(pairs, start=1):
+        if actual != expected:
+            return line_number, actual, expected
+    return None
+
+
+@unittest.skipUnless(
+    os.environ.get("PACK_RUN_SLOW_TESTS") == "1",
+    "slow network test; set PACK_RUN_SLOW_TESTS=1 to run it")
 class TestPackE2ESlow(unittest.TestCase):
     """
     End-to-end tests for the pack script. These tests are slow as they clone
-    a repository from the internet.
+    a repository from the internet, so they only run when the environment
+    variable PACK_RUN_SLOW_TESTS is set to 1. The checkout is cached under
+    $PACK_TEST_CACHE (default ~/.cache/pack-tests), so only the first run
+    downloads it.
+
+    The tests only read the checkout, so they can be spread over processes
+    with pytest-xdist once the checkout is cached:
+    python tests/test_pack_e2e_slow.py --fetch
+    PACK_RUN_SLOW_TESTS=1 pytest -n auto tests/test_pack_e2e_slow.py
     """
     repo_url = "https://github.com/SWE-bench/SWE-bench"
     commit_hash = "5cd4be9fb239716"
+    golden_filenames = (
+        'swe-bench-5cd4be9fb239716_tokens.txt',
+        'swe-bench-5cd4be9fb239716_paths-only.txt',
+        'swe-bench-5cd4be9fb239716_include-py.txt',
+        'swe-bench-5cd4be9fb239716_exclude-yml.txt',
+        'swe-bench-5cd4be9fb239716_max-10k.txt',
+    )
     temp_dir = None
     repo_path = None
 
@@ -34,30 +91,94 @@ class TestPackE2ESlow(unittest.TestCase):
     def setUpClass(cls):
         """
         Set up the test environment by cloning the repository once for all tests.
-        This is much more efficient than cloning for each test.
+        This is much more efficient than cloning for each test. The checkout
+        is kept in a cache directory keyed by commit and reused by later runs;
+        the tests only read from it.
         """
+        # Fail before the slow clone if a golden file is missing
+        missing = [name for name in cls.golden_filenames
+                   if not (GOLDEN_DIR / name).is_file()]
+        if missing:
+            raise FileNotFoundError(
+                f"Golden files not found in {GOLDEN_DIR}: {', '.join(missing)}")
+
         cls.temp_dir = tempfile.TemporaryDirectory()
-        cls.repo_path = os.path.join(cls.temp_dir.name, 'SWE-bench')
+        cls.fetch_checkout()
 
-        print(f"\nCloning {cls.repo_url} into {cls.repo_path}...")
-        subprocess.run(
-            ['git', 'clone', cls.repo_url, cls.repo_path],
-            check=True, capture_output=True, text=True
-        )
-        print(f"Checking out commit {cls.commit_hash}...")
-        subprocess.run(
-            ['git', '-C', cls.repo_path, 'checkout', cls.commit_hash],
-            check=True, capture_output=True, text=True
+    @classmethod
+    def fetch_checkout(cls):
+        """
+        Make sure the cached checkout of repo_url at commit_hash exists,
+        cloning it if needed, and set repo_path to it. When the tests are
+        spread over processes, run this once beforehand with
+        `python tests/test_pack_e2e_slow.py --fetch`, so the processes share
+        one clone instead of each making its own.
+        """
+        cache_root = Path(os.environ.get(
+            "PACK_TEST_CACHE", Path.home() / ".cache" / "pack-tests"))
+        cls.repo_path = str(cache_root / f"SWE-bench-{cls.commit_hash}")
+        if cls._is_cached_checkout_valid():
+            print(f"\nUsing cached checkout {cls.repo_path}")
+            return
+        if os.path.exists(cls.repo_path):
+            print(f"\nDiscarding stale cached checkout {cls.repo_path}")
+            shutil.rmtree(cls.repo_path)
+
+        # Clone next to the cache entry and move it into place only once it
+        # is complete, so an interrupted run never leaves a broken cache.
+        cache_root.mkdir(parents=True, exist_ok=True)
+        clone_path = tempfile.mkdtemp(dir=cache_root, prefix=".clone-")
+        try:
+            # A blobless clone fetches commits and trees only; checkout then
+            # downloads just the blobs of the one commit we need.
+            print(f"\nCloning {cls.repo_url} into {cls.repo_path}...")
+            # --quiet keeps git's progress meter off the pipes; stderr is
+            # still captured for the error message if a command fails.
+            subprocess.run(
+                ['git', 'clone', '--quiet', '--filter=blob:none',
+                 '--no-checkout', cls.repo_url, clone_path],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                text=True
+            )
+            print(f"Checking out commit {cls.commit_hash}...")
+            subprocess.run(
+                ['git', '-C', clone_path, '-c', 'advice.detachedHead=false',
+                 'checkout', '--quiet', cls.commit_hash],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                text=True
+            )
+            try:
+                os.rename(clone_path, cls.repo_path)
+            except OSError:
+                # Another test process populated the cache first
+                if not cls._is_cached_checkout_valid():
+                    raise
+                shutil.rmtree(clone_path, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(clone_path, ignore_errors=True)
+            raise
+
+    @classmethod
+    def _is_cached_checkout_valid(cls):
+        """Check that the cached checkout exists and is at commit_hash."""
+        if not os.path.isdir(os.path.join(cls.repo_path, '.git')):
+            return False
+        head = subprocess.run(
+            ['git', '-C', cls.repo_path, 'rev-parse', 'HEAD'],
+            capture_output=True, text=True
         )
+        return (head.returncode == 0
+                and head.stdout.strip().startswith(cls.commit_hash))
 
     @classmethod
     def tearDownClass(cls):
         """
-        Clean up the temporary directory after all tests are done.
+        Clean up the temporary directory after all tests are done. The cached
+        checkout is kept for the next run.
         """
         if cls.temp_dir:
             cls.temp_dir.cleanup()
-            print("\nCleaned up temporary repository.")
+            print("\nCleaned up temporary directory.")
 
     def setUp(self):
         """
@@ -76,7 +197,7 @@ class TestPackE2ESlow(unittest.TestCase):
         Helper method to run the pack script with given arguments and compare
         its output to a golden file.
         """
-        golden_file_path = Path(__file__).parent / "golden_files" / golden_filename
+        golden_file_path = GOLDEN_DIR / golden_filename
         Path(self.test_output_file_path).unlink(missing_ok=True)
 
         # Build argv list: ['pack.py'] + cli_args + [repo_path]
@@ -97,22 +218,29 @@ class TestPackE2ESlow(unittest.TestCase):
         finally:
             sys.stdout = old_stdout
             sys.stderr = old_stderr
-        with open(self.test_output_file_path, 'r', encoding='utf-8') as f:
-            actual_output = f.read()
-
-        with open(golden_file_path, 'r', encoding='utf-8') as f:
-            expected_output = f.read()
-        # Normalize line endings and strip whitespace for consistent comparison
-        actual_lines = [line.strip() for line in actual_output.strip().splitlines()]
-        expected_lines = [line.strip() for line in expected_output.strip().splitlines()]
-
-        self.assertEqual(
-            actual_lines,
-            expected_lines,
-            f"Output for '{' '.join(cli_args)}' does not match {golden_filename}.\n"
-            f"stdout: {stdout}\n"
-            f"stderr: {stderr}"
-        )
+
+        # pack wrote straight to the output file. The common case is an exact
+        # match, which filecmp confirms with a chunked byte compare; only
+        # otherwise are the outputs read in and normalized below.
+        if filecmp.cmp(self.test_output_file_path, golden_file_path,
+                       shallow=False):
+            return
+
+        # Normalize line endings and strip whitespace for consistent
+        # comparison. Both files are streamed and the comparison stops at the
+        # first differing line, so no full copies are held in memory.
+        mismatch = _first_mismatch(self.test_output_file_path,
+                                   golden_file_path)
+        if mismatch is not None:
+            line_number, actual_line, expected_line = mismatch
+            self.fail(
+                f"Output for '{' '.join(cli_args)}' does not match {golden_filename}"
+                f" at line {line_number}:\n"
+                f"actual:   {actual_line!r}\n"
+                f"expected: {expected_line!r}\n"
+                f"stdout: {stdout}\n"
+                f"stderr: {stderr}"
+            )
 
     def test_pack_token_size_output(self):
         """
@@ -160,4 +288,8 @@ class TestPackE2ESlow(unittest.TestCase):
         )
 
 if __name__ == '__main__':
-    unittest.main()
+    if sys.argv[1:] == ['--fetch']:
+        # Only fill the checkout cache, e.g. before a parallel test run
+        TestPackE2ESlow.fetch_checkout()
+    else:
+        unittest.main()